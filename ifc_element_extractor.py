@@ -3,20 +3,69 @@
 
 import argparse
 import csv
+import functools
+import io
+import multiprocessing
 import os
-from typing import List, Dict, Any
+import queue
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Set, Tuple
 
 try:
     import ifcopenshell
 except ImportError:
     raise SystemExit("Please install ifcopenshell:  pip install ifcopenshell")
 
+try:
+    from ifcopenshell.util.element import get_container as _util_get_container
+    from ifcopenshell.util.element import get_psets as _util_get_psets
+except ImportError:
+    _util_get_container = None
+    _util_get_psets = None
+
 try:
     import pandas as pd   # optional
     PANDAS = True
 except Exception:
     PANDAS = False
 
+try:
+    import pyarrow as pa            # optional, Parquet export
+    import pyarrow.parquet as pq
+    PYARROW = True
+except Exception:
+    PYARROW = False
+
+try:
+    import ifcfast   # optional, Rust-backed columnar parser for large models
+    import ifcfast.whitelist
+    IFCFAST = True
+except Exception:
+    IFCFAST = False
+
+# Files at least this big go through ifcfast (when installed)
+FAST_PARSE_MIN_BYTES = 100 * 1024 * 1024
+
+# Background CSV writer: rows per formatted chunk, queue depth, file buffer
+CSV_BATCH_ROWS = 1000
+CSV_QUEUE_CHUNKS = 64
+CSV_BUFFER_BYTES = 1 << 20
+
+# Excel sheet limits (rows include the header)
+XLSX_MAX_ROWS = 1048576
+XLSX_MAX_COLS = 16384
+
+# Top-level attributes indexed by ifcfast → ProductRow field
+FAST_ATTRS = {
+    "Name": "name",
+    "PredefinedType": "predefined_type",
+    "Tag": "tag",
+    "ObjectType": "object_type",
+}
+
 
 # -------- Helpers --------
 def get_name(entity) -> str:
@@ -27,191 +76,639 @@ def get_name(entity) -> str:
     return f"{entity.is_a()}_{entity.id()}"
 
 
-def get_level(entity) -> str:
+_NOT_RESOLVED = object()
+
+# ifcopenshell >= 0.8 exposes the schema accessors on the entity, 0.7 on wrapped_data
+_DIRECT_ACCESS = hasattr(ifcopenshell.entity_instance, "get_attribute_category")
+
+# ifcopenshell attribute categories; 0 is returned both for names the class
+# does not have and for EXPRESS-derived attributes (e.g. IfcCartesianPoint.Dim)
+_INVALID, _FORWARD = 0, 1
+
+# (entity class, attribute) → STEP argument index, -1 when the class has no
+# such attribute, None for inverse/derived attributes (read by name).
+# Indexes differ between schemas: reset with _ATTR_INDEX.clear() per model.
+_ATTR_INDEX: Dict[Tuple[str, str], Optional[int]] = {}
+
+
+def get_attribute(entity, cls: str, name: str, default: Any = "") -> Any:
     """
-    Attempts to retrieve the level/floor name via IfcRelContainedInSpatialStructure.
-    Returns '' if not found.
+    getattr(entity, name, default) with the schema lookup done once per class.
+    Missing names would otherwise fall through to the EXPRESS rule lookup.
     """
-    try:
-        if hasattr(entity, "ContainedInStructure"):
-            # IFC4
-            rels = entity.ContainedInStructure or []
+    key = (cls, name)
+    idx = _ATTR_INDEX.get(key, _NOT_RESOLVED)
+    if idx is _NOT_RESOLVED:
+        data = entity if _DIRECT_ACCESS else entity.wrapped_data
+        cat = data.get_attribute_category(name)
+        if cat == _FORWARD:
+            idx = data.get_argument_index(name)
+        elif cat == _INVALID:
+            # Tell derived attributes from real misses with one by-name lookup
+            val = getattr(entity, name, _NOT_RESOLVED)
+            _ATTR_INDEX[key] = -1 if val is _NOT_RESOLVED else None
+            return default if val is _NOT_RESOLVED else val
         else:
-            # Generic approach
-            rels = [r for r in (entity.ContainedInStructure or [])]
+            idx = None
+        _ATTR_INDEX[key] = idx
+    if idx is None:
+        return getattr(entity, name, default)
+    if idx < 0:
+        return default
+    return entity[idx]
 
-    except Exception:
-        rels = []
 
-    # Alternative: check inverse relationships
-    if not rels:
-        try:
-            # Use inverted relationships
-            for inv in entity.IsContainedIn:
-                if inv.is_a("IfcRelContainedInSpatialStructure") and inv.RelatingStructure:
-                    return get_name(inv.RelatingStructure)
-        except Exception:
-            pass
+# Container STEP id → level name, so each storey is named once.
+# STEP ids are per file: reset with _LEVEL_CACHE.clear() when switching models.
+_LEVEL_CACHE: Dict[int, str] = {}
 
-    for rel in rels:
-        try:
+
+def get_level(entity) -> str:
+    """
+    Retrieves the level/floor name of the spatial structure containing the
+    entity (IfcRelContainedInSpatialStructure, directly or via its aggregate).
+    Returns '' if not found.
+    """
+    if _util_get_container is not None:
+        container = _util_get_container(entity)
+    else:
+        container = None
+        for rel in getattr(entity, "ContainedInStructure", None) or []:
             if rel.is_a("IfcRelContainedInSpatialStructure") and rel.RelatingStructure:
-                return get_name(rel.RelatingStructure)
-        except Exception:
-            pass
-    return ""
+                container = rel.RelatingStructure
+                break
+    if container is None:
+        return ""
+
+    cid = container.id()
+    name = _LEVEL_CACHE.get(cid)
+    if name is None:
+        name = _LEVEL_CACHE[cid] = sys.intern(get_name(container))
+    return name
+
+
+def _read_property_set(props, out: Dict[str, Any]):
+    for p in props.HasProperties or []:
+        key = sys.intern(f"{props.Name}:{p.Name}")
+        out[key] = getattr(p, "NominalValue", getattr(p, "Description", None))
+
+
+_QTY_FIELDS = ("LengthValue", "AreaValue", "VolumeValue", "CountValue", "WeightValue", "TimeValue")
+
+# Quantity class name → its value attribute ('' for complex quantities)
+_QTY_VALUE_ATTRS: Dict[str, str] = {}
+
+
+def _quantity_value(q):
+    cls = q.is_a()
+    attr = _QTY_VALUE_ATTRS.get(cls)
+    if attr is None:
+        # Each IfcPhysicalSimpleQuantity subtype carries exactly one of these
+        attr = _QTY_VALUE_ATTRS[cls] = next((f for f in _QTY_FIELDS if hasattr(q, f)), "")
+    return getattr(q, attr) if attr else None
+
 
+def _read_element_quantity(props, out: Dict[str, Any]):
+    for q in props.Quantities or []:
+        key = sys.intern(f"{props.Name}:{q.Name}")
+        out[key] = _quantity_value(q)
 
-def get_psets(entity) -> Dict[str, Any]:
+
+def _skip_definition(props, out: Dict[str, Any]):
+    pass
+
+
+# Property definition class name → reader, filled on first sight of each class
+_DEFINITION_HANDLERS: Dict[str, Callable[[Any, Dict[str, Any]], None]] = {}
+
+
+def _resolve_definition_handler(props) -> Callable[[Any, Dict[str, Any]], None]:
+    if props.is_a("IfcPropertySet"):
+        return _read_property_set
+    if props.is_a("IfcElementQuantity"):
+        return _read_element_quantity
+    return _skip_definition
+
+
+def get_psets(entity, names: Optional[Set[str]] = None) -> Dict[str, Any]:
     """
     Returns a flat dict of all properties (Psets + Qto):
     { 'Pset_WallCommon:FireRating': 'REI60', 'Qto_WallBaseQuantities:Length': 12.3, ... }
+    names, when given, limits the result to those Pset/Qto names.
     """
     out = {}
-    try:
-        psets = ifcopenshell.util.element.get_psets(entity, include_inherited=True)  # type: ignore
-    except Exception:
-        # Fallback without util
-        psets = {}
-        # Through IsDefinedBy → IfcRelDefinesByProperties → IfcPropertySet/IfcElementQuantity
-try:
-    psets = ifcopenshell.util.element.get_psets(entity, include_inherited=True)  # type: ignore
-except Exception:
-    # Fallback without util
-    psets = {}
-    # Through IsDefinedBy → IfcRelDefinesByProperties → IfcPropertySet/IfcElementQuantity
-    try:
-        for rel in getattr(entity, "IsDefinedBy", []) or []:
-            props = getattr(rel, "RelatingPropertyDefinition", None)
-            if not props:
+    if _util_get_psets is not None:
+        # util returns values grouped by Pset, plus the Pset's own 'id'
+        for grp, vals in _util_get_psets(entity, should_inherit=True).items():
+            if names is not None and grp not in names:
                 continue
-            if props.is_a("IfcPropertySet"):
-                for p in props.HasProperties or []:
-                    key = f"{props.Name}:{p.Name}"
-                    out[key] = getattr(p, "NominalValue", getattr(p, "Description", None))
-            elif props.is_a("IfcElementQuantity"):
-                for q in props.Quantities or []:
-                    val = None
-                    for f in ("LengthValue", "AreaValue", "VolumeValue", "CountValue", "WeightValue", "TimeValue"):
-                        if hasattr(q, f) and getattr(q, f) is not None:
-                            val = getattr(q, f)
-                            break
-                    key = f"{props.Name}:{q.Name}"
-                    out[key] = val
-    except Exception:
-        pass
-
-    if psets:
-        # util returns already flat structure, but grouped by Pset
-        flat = {}
-        for grp, vals in psets.items():
             if isinstance(vals, dict):
                 for k, v in vals.items():
-                    flat[f"{grp}:{k}"] = v
+                    if k != "id":
+                        out[sys.intern(f"{grp}:{k}")] = v
             else:
-                flat[grp] = vals
-        out.update(flat)
-        # util returns already flat structure, but grouped by Pset
-        flat = {}
-        for grp, vals in psets.items():
-            if isinstance(vals, dict):
-                for k, v in vals.items():
-                    flat[f"{grp}:{k}"] = v
-            else:
-                flat[grp] = vals
-        out.update(flat)
+                out[grp] = vals
+        return out
+
+    # Fallback without util
+    # Through IsDefinedBy → IfcRelDefinesByProperties → IfcPropertySet/IfcElementQuantity
+    for rel in getattr(entity, "IsDefinedBy", None) or ():
+        definition = getattr(rel, "RelatingPropertyDefinition", None)
+        if not definition:
+            continue
+        # IFC4 allows an IfcPropertySetDefinitionSet (a tuple of sets) here
+        for props in definition if isinstance(definition, tuple) else (definition,):
+            if names is not None and props.Name not in names:
+                continue
+            cls = props.is_a()
+            handler = _DEFINITION_HANDLERS.get(cls)
+            if handler is None:
+                handler = _DEFINITION_HANDLERS[cls] = _resolve_definition_handler(props)
+            handler(props, out)
+    return out
+
 
-    #    return out
-    
 def gather_elements(model, classes: List[str]) -> List[Any]:
     elems = []
     if not classes or classes == ["*"]:
-        # Select all elements that have a GlobalId (filter out irrelevant objects)
-        for ent in model:
-            try:
-                if hasattr(ent, "GlobalId") and ent.GlobalId:
-                    elems.append(ent)
-            except Exception:
-                pass
-        return elems
+        # Every IfcRoot (and nothing else) carries a GlobalId
+        return list(model.by_type("IfcRoot"))
 
     for c in classes:
         try:
             elems.extend(model.by_type(c))
-        except Exception:
+        except RuntimeError:
+            # Class not in this model's schema (e.g. IFC4-only class in IFC2x3)
             pass
     return elems
 
 
+_NO_VALUE = object()
+
+
+def _empty(val):
+    return ""
+
+
+def _identity(val):
+    # Primitives stay as-is; writers format them at output
+    return val
+
+
+def _wrapped_or_str(val):
+    # entity_instance: defined-type values (IfcLabel, IfcLengthMeasure, ...) wrap a primitive
+    w = getattr(val, "wrappedValue", _NO_VALUE)
+    return str(val) if w is _NO_VALUE else w
+
+
+def _resolve_normalizer(t: type) -> Callable[[Any], Any]:
+    # Dynamic attributes (ifcopenshell entities) can only be checked per value
+    if hasattr(t, "__getattr__") or any("wrappedValue" in vars(c) for c in t.__mro__):
+        return _wrapped_or_str
+    return str
+
+
+# Value type → normalizer, extended on first sight of each type
+_NORMALIZERS: Dict[type, Callable[[Any], Any]] = {
+    type(None): _empty,
+    str: _identity,
+    int: _identity,
+    float: _identity,
+    bool: _identity,
+}
+
+
 def normalize(val):
-    if val is None:
-        return ""
-    if hasattr(val, "wrappedValue"):
-        return val.wrappedValue
-    return str(val)
+    t = type(val)
+    f = _NORMALIZERS.get(t)
+    if f is None:
+        f = _NORMALIZERS[t] = _resolve_normalizer(t)
+    return f(val)
+
+
+# -------- Rows & columns --------
+BASE_COLS = ["GlobalId", "Entity", "Name", "Level"]
+
+
+def fixed_columns(top_props: List[str]) -> List[str]:
+    # Include top_props if not already present
+    return BASE_COLS + [p for p in dict.fromkeys(top_props) if p not in BASE_COLS]
+
+
+def new_columns(top_props: List[str]) -> Dict[str, int]:
+    """
+    Header table: column name → index, in discovery order. Seeded with the
+    fixed columns; Psets/Qto keys are appended by column_index().
+    """
+    return {k: i for i, k in enumerate(fixed_columns(top_props))}
+
+
+def column_index(key_to_col: Dict[str, int], key: str) -> int:
+    i = key_to_col.get(key)
+    if i is None:
+        i = key_to_col[key] = len(key_to_col)
+    return i
+
+
+def header_order(key_to_col: Dict[str, int], n_fixed: int) -> Tuple[List[str], List[int]]:
+    """
+    Final column order: fixed columns, then Psets/Qto sorted by name.
+    Returns (header, pos) where pos[col] is the header position of a
+    discovery-order column index.
+    """
+    columns = list(key_to_col)
+    dyn_cols = sorted(range(n_fixed, len(columns)), key=columns.__getitem__)
+    header = columns[:n_fixed] + [columns[i] for i in dyn_cols]
+    pos = list(range(len(columns)))
+    for j, i in enumerate(dyn_cols, n_fixed):
+        pos[i] = j
+    return header, pos
+
+
+def aligned_rows(rows, pos: List[int], n_fixed: int) -> Iterator[List[Any]]:
+    """
+    Expands sparse (cells, props) rows into full positional lists.
+    Fixed cells keep their place; only Psets/Qto values go through pos.
+    """
+    pad = [""] * (len(pos) - n_fixed)
+    for cells, props in rows:
+        out = cells + pad
+        for i, v in props:
+            out[pos[i]] = v
+        yield out
+
+
+def table_columns(rows, pos: List[int], n_fixed: int) -> Iterator[List[Any]]:
+    """
+    Column-wise view of sparse rows, one list per header column with missing
+    Psets/Qto values as None. Values are first bucketed per column, then each
+    column is padded and yielded in turn, so only one dense column is alive.
+    """
+    n = len(rows)
+    fixed = list(zip(*(cells for cells, _ in rows))) or [()] * n_fixed
+    buckets: List[List[Tuple[int, Any]]] = [[] for _ in pos]
+    for r, (_, props) in enumerate(rows):
+        for i, v in props:
+            buckets[pos[i]].append((r, v))
+    for j, bucket in enumerate(buckets):
+        col = list(fixed[j]) if j < n_fixed else [None] * n
+        for r, v in bucket:
+            col[r] = v
+        yield col
+
+
+# -------- Columnar path (ifcfast) --------
+def _concrete_subtypes(decl) -> Iterator[Any]:
+    if not decl.is_abstract():
+        yield decl
+    for sub in decl.subtypes():
+        yield from _concrete_subtypes(sub)
+
+
+def fast_indexes_classes(ifc_path: str, classes: List[str]) -> bool:
+    """
+    True when every instantiable subtype of every class is in ifcfast's
+    product whitelist. Spatial structure (IfcSite, IfcBuildingStorey, ...),
+    types, IfcProject and relationships are not indexed, and by_type()
+    returns [] for them instead of failing.
+    """
+    indexed = ifcfast.whitelist.product_types()
+    try:
+        schema = ifcopenshell.ifcopenshell_wrapper.schema_by_name(ifcfast.header(ifc_path).schema)
+        decls = [schema.declaration_by_name(c) for c in classes]
+    except Exception:
+        # Unreadable header, unknown schema or class: let ifcopenshell decide
+        return False
+    return all(d.name() in indexed for decl in decls for d in _concrete_subtypes(decl))
+
+
+def use_fast_parser(ifc_path: str, classes: List[str], top_props: List[str]) -> bool:
+    """
+    ifcfast only indexes part of IfcProduct and a handful of attributes, so it
+    is used for large files with explicit, indexed classes whose top_props it
+    can answer.
+    """
+    if not IFCFAST or not classes or classes == ["*"]:
+        return False
+    if any(p not in FAST_ATTRS for p in top_props):
+        return False
+    try:
+        if os.path.getsize(ifc_path) < FAST_PARSE_MIN_BYTES:
+            return False
+    except OSError:
+        return False
+    return fast_indexes_classes(ifc_path, classes)
+
+
+def _bool_or_str(val: str) -> Any:
+    # IfcLogical also allows UNKNOWN, which stays a string
+    return {"True": True, "False": False}.get(val, val)
+
+
+# EXPRESS simple type → cast for ifcfast's stringified values
+_SIMPLE_CASTS: Dict[str, Callable[[str], Any]] = {
+    "integer": int,
+    "real": float,
+    "number": float,
+    "boolean": _bool_or_str,
+    "logical": _bool_or_str,
+}
+
+
+def _value_caster(schema, value_type: str) -> Callable[[str], Any]:
+    """
+    Cast for one IfcValue type name (IfcInteger, IfcLengthMeasure, ...),
+    resolved through its defined types down to the EXPRESS simple type.
+    Values that do not parse are kept as strings.
+    """
+    try:
+        t = schema.declaration_by_name(value_type).declared_type()
+        while isinstance(t, ifcopenshell.ifcopenshell_wrapper.named_type):
+            t = t.declared_type().declared_type()
+        cast = _SIMPLE_CASTS.get(t.declared_type(), _identity)
+    except Exception:
+        return _identity
+    if cast in (_identity, _bool_or_str):
+        return cast
+
+    def cast_or_str(val: str) -> Any:
+        try:
+            return cast(val)
+        except ValueError:
+            return val
+    return cast_or_str
+
+
+def extract_fast(ifc_path: str, classes: List[str], top_props: List[str], limit: int = 0,
+                 psets: Optional[Set[str]] = None):
+    """
+    Reads base attributes from the ifcfast product index and Psets/Qto from its
+    long-format tables in one scan. Returns (rows, key_to_col) like
+    extract_model(). Level comes from ifcfast for elements contained directly
+    in a storey; the model is opened with ifcopenshell only when some element
+    is not, to resolve it through get_level().
+    """
+    m = ifcfast.open(ifc_path)
+    schema = ifcopenshell.ifcopenshell_wrapper.schema_by_name(ifcfast.header(ifc_path).schema)
+
+    products = []
+    for c in classes:
+        try:
+            products.extend(m.by_type(c))   # subtypes included, like model.by_type
+        except ValueError:
+            pass
+    if limit > 0:
+        products = products[:limit]
+    target_guids = {p.guid for p in products}
+
+    # Sparse guid → [(col, value), ...]; a dense pivot would allocate every (guid, key) cell
+    key_to_col = new_columns(top_props)
+    props_by_guid: Dict[str, List[Tuple[int, Any]]] = {}
+    if psets is None or psets:
+        # Psets + Qto as one long table: guid | key | value | value_type (loaded
+        # lazily by ifcfast). Quantity values are all IfcMeasure reals.
+        cols = ["guid", "pset_name", "prop_name", "value", "value_type"]
+        qtos = m.quantities.rename(columns={"qto_name": "pset_name", "quantity_name": "prop_name"})
+        qtos = qtos.assign(value_type="IfcReal")
+        long_df = pd.concat(
+            [m.psets[cols], qtos[cols]],
+            ignore_index=True,
+        )
+        mask = long_df.guid.isin(target_guids) & long_df.value.notna()
+        if psets is not None:
+            mask &= long_df.pset_name.isin(psets)
+        long_df = long_df[mask]
+        long_df = long_df.assign(key=long_df.pset_name + ":" + long_df.prop_name)
+        long_df = long_df.drop_duplicates(subset=["guid", "key"], keep="first")
+
+        # ifcfast stringifies values; cast scalars back to their IFC type (list and
+        # bounded values stay in ifcfast's "a, b" / "1..2" form, see README)
+        casts: Dict[str, Callable[[str], Any]] = {}
+        for g, k, v, t in zip(long_df.guid, long_df.key, long_df.value, long_df.value_type):
+            cast = casts.get(t)
+            if cast is None:
+                cast = casts[t] = _value_caster(schema, t)
+            props_by_guid.setdefault(g, []).append((column_index(key_to_col, k), cast(v)))
+
+    n_fixed = len(fixed_columns(top_props))
+    rows = [None] * len(products)
+    model = None
+    for r, p in enumerate(products):
+        level = p.storey_name
+        if level is None:
+            # ifcfast only names storeys of directly contained elements; anything
+            # in an IfcSpace, IfcSite, ... (or uncontained) goes through get_level()
+            if model is None:
+                model = ifcopenshell.open(ifc_path)
+                _LEVEL_CACHE.clear()
+            level = get_level(model.by_id(p.step_id))
+        cells = [p.guid, sys.intern(p.entity), p.name or p.guid, sys.intern(level)]
+        cells.extend([""] * (n_fixed - len(cells)))
+        for a in top_props:
+            cells[key_to_col[a]] = normalize(getattr(p, FAST_ATTRS[a]))
+        rows[r] = (cells, props_by_guid.get(p.guid, []))
+    return rows, key_to_col
 
 
 # -------- Main extraction --------
-def extract(ifc_path: str, out_csv: str, classes: List[str], top_props: List[str], limit: int = 0):
+# Elements per worker task when --workers > 1
+CHUNK_SIZE = 1000
+
+# Worker-side models, one per IFC path
+_MODEL_CACHE: Dict[str, Any] = {}
+
+
+def extract_elements(elements, top_props: List[str], psets: Optional[Set[str]] = None):
+    """
+    Collects base attributes + psets. Returns (rows, key_to_col), each row
+    being (fixed cells, [(col, value), ...] for Psets/Qto).
+    """
+    key_to_col = new_columns(top_props)
+    n_fixed = len(key_to_col)
+    # One row per element, so the list is sized up front
+    rows = [None] * len(elements)
+
+    for r, e in enumerate(elements):
+        cls = sys.intern(e.is_a())
+        cells = [getattr(e, "GlobalId", ""), cls, get_name(e), get_level(e)]
+        cells.extend([""] * (n_fixed - len(cells)))
+        # Try to get top_props as direct attributes
+        for p in top_props:
+            cells[key_to_col[p]] = normalize(get_attribute(e, cls, p))
+        # psets (an empty selection skips the traversal entirely)
+        props = []
+        pset_dict = get_psets(e, psets) if psets is None or psets else {}
+        for k, v in pset_dict.items():
+            if v is None:
+                continue
+            props.append((column_index(key_to_col, str(k)), normalize(v)))
+        rows[r] = (cells, props)
+    return rows, key_to_col
+
+
+def _extract_chunk(ifc_path: str, ids: List[int], top_props: List[str], psets: Optional[Set[str]]):
+    """
+    Worker task: opens the model once per process and extracts the given
+    STEP ids. Returns (rows, columns) with columns in local index order.
+    """
+    model = _MODEL_CACHE.get(ifc_path)
+    if model is None:
+        model = _MODEL_CACHE[ifc_path] = ifcopenshell.open(ifc_path)
+        _LEVEL_CACHE.clear()
+        _ATTR_INDEX.clear()
+    rows, key_to_col = extract_elements([model.by_id(i) for i in ids], top_props, psets)
+    return rows, list(key_to_col)
+
+
+def extract_parallel(ifc_path: str, elements, top_props: List[str], workers: int,
+                     psets: Optional[Set[str]] = None):
+    """
+    Shards elements over worker processes and merges their rows, remapping
+    each chunk's local column indexes onto one header table.
+    """
+    ids = [e.id() for e in elements]
+    chunks = [ids[i:i + CHUNK_SIZE] for i in range(0, len(ids), CHUNK_SIZE)]
+
+    key_to_col = new_columns(top_props)
+    rows = [None] * len(ids)
+    r = 0
+    # spawn: forked children would share ifcopenshell's native state
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        results = pool.map(_extract_chunk, repeat(ifc_path), chunks, repeat(top_props), repeat(psets))
+        for chunk_rows, chunk_cols in results:
+            remap = [column_index(key_to_col, k) for k in chunk_cols]
+            for cells, props in chunk_rows:
+                rows[r] = (cells, [(remap[i], v) for i, v in props])
+                r += 1
+    return rows, key_to_col
+
+
+def extract_model(ifc_path: str, classes: List[str], top_props: List[str], limit: int = 0,
+                  workers: int = 1, psets: Optional[Set[str]] = None):
+    """
+    Walks elements through ifcopenshell, in worker processes when workers > 1.
+    Returns (rows, key_to_col).
+    """
     model = ifcopenshell.open(ifc_path)
+    _LEVEL_CACHE.clear()
+    _ATTR_INDEX.clear()
 
     elements = gather_elements(model, classes)
     if limit > 0:
         elements = elements[:limit]
 
-    # Base columns
-    base_cols = ["GlobalId", "Entity", "Name", "Level"]
-    rows = []
-    all_dyn_keys = set()
+    if workers > 1 and len(elements) > CHUNK_SIZE:
+        return extract_parallel(ifc_path, elements, top_props, workers, psets)
+    return extract_elements(elements, top_props, psets)
 
-    # Process elements and collect base attributes + psets
-    for e in elements:
-        try:
-            base = {
-                "GlobalId": getattr(e, "GlobalId", ""),
-                "Entity": e.is_a(),
-                "Name": get_name(e),
-                "Level": get_level(e)
-            }
-            # Try to get top_props as direct attributes
-            for p in top_props:
-                base[p] = normalize(getattr(e, p, ""))
-            # psets
-            pset_dict = get_psets(e)
-            for k, v in pset_dict.items():
-                if v is None:
-                    continue
-                key = str(k)
-                base[key] = normalize(v)
-                all_dyn_keys.add(key)
-            rows.append(base)
-        except Exception:
-            continue
 
-    # Final column order
-    dyn_cols = sorted(list(all_dyn_keys))
-    # Include top_props if not already present
-    extra_top = [p for p in top_props if p not in base_cols and p not in dyn_cols]
-    header = base_cols + extra_top + dyn_cols
-
-    # Write CSV
-    os.makedirs(os.path.dirname(os.path.abspath(out_csv)) or ".", exist_ok=True)
-    with open(out_csv, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=header)
-        writer.writeheader()
-        for r in rows:
-            writer.writerow({k: r.get(k, "") for k in header})
+def extract(ifc_path: str, out_csv: str, classes: List[str], top_props: List[str], limit: int = 0,
+            out_xlsx: str = "", workers: int = 1, out_parquet: str = "",
+            psets: Optional[Set[str]] = None):
+    """
+    psets: Pset/Qto names to export; None for all, empty for none.
+    """
+    if use_fast_parser(ifc_path, classes, top_props):
+        rows, key_to_col = extract_fast(ifc_path, classes, top_props, limit, psets)
+    else:
+        rows, key_to_col = extract_model(ifc_path, classes, top_props, limit, workers, psets)
+
+    n_fixed = len(fixed_columns(top_props))
+    header, pos = header_order(key_to_col, n_fixed)
+
+    write_csv(out_csv, header, aligned_rows(rows, pos, n_fixed))
+    if out_parquet:
+        write_parquet(out_parquet, header, table_columns(rows, pos, n_fixed))
+    if out_xlsx:
+        if len(rows) + 1 > XLSX_MAX_ROWS or len(header) > XLSX_MAX_COLS:
+            print(f"[WARN] {len(rows)} rows x {len(header)} columns do not fit an Excel sheet, "
+                  f"skipping {out_xlsx} (use --parquet)")
+        else:
+            write_xlsx(out_xlsx, header, aligned_rows(rows, pos, n_fixed))
 
     print(f"[OK] Extracted {len(rows)} elements → {out_csv}")
     print(f"Classes: {', '.join(classes) if classes else 'ALL'}")
     if PANDAS:
         try:
-            df = pd.read_csv(out_csv)
-            print(df.head(10).to_string(index=False))
+            df = pd.DataFrame.from_records(aligned_rows(rows[:10], pos, n_fixed), columns=header)
+            print(df.to_string(index=False))
         except Exception:
             pass
 
 
+# -------- Output --------
+@functools.lru_cache(maxsize=None)
+def _ensure_dir(path: str):
+    # Once per directory per process
+    os.makedirs(path or ".", exist_ok=True)
+
+
+def write_csv(out_csv: str, header: List[str], rows: Iterable[List[Any]]):
+    """
+    Runs once extraction has returned every row. Rows are aligned and
+    formatted on the calling thread; a writer thread only pushes the
+    formatted chunks to disk, so file I/O (which releases the GIL) overlaps
+    with row alignment and CSV formatting.
+    """
+    _ensure_dir(os.path.dirname(os.path.abspath(out_csv)))
+    with open(out_csv, "wb", buffering=CSV_BUFFER_BYTES) as f:
+        chunks: queue.Queue = queue.Queue(maxsize=CSV_QUEUE_CHUNKS)
+        errors: List[BaseException] = []
+
+        def drain():
+            try:
+                for chunk in iter(chunks.get, None):
+                    f.write(chunk)
+            except BaseException as exc:
+                errors.append(exc)
+                for _ in iter(chunks.get, None):   # keep the producer unblocked
+                    pass
+
+        t = threading.Thread(target=drain, name="csv-writer", daemon=True)
+        t.start()
+        try:
+            buf = io.StringIO(newline="")
+            writer = csv.writer(buf)
+            writer.writerow(header)
+            n = 0
+            for row in rows:
+                writer.writerow(row)
+                n += 1
+                if n == CSV_BATCH_ROWS:
+                    chunks.put(buf.getvalue().encode("utf-8"))
+                    buf.seek(0)
+                    buf.truncate()
+                    n = 0
+            chunks.put(buf.getvalue().encode("utf-8"))
+        finally:
+            chunks.put(None)   # sentinel: flush and stop
+            t.join()
+        if errors:
+            raise errors[0]
+
+
+def write_xlsx(out_xlsx: str, header: List[str], rows: Iterable[List[Any]]):
+    if not PANDAS:
+        raise SystemExit("Excel export needs pandas + openpyxl:  pip install pandas openpyxl")
+    _ensure_dir(os.path.dirname(os.path.abspath(out_xlsx)))
+    pd.DataFrame.from_records(rows, columns=header).to_excel(out_xlsx, index=False)
+
+
+def write_parquet(out_parquet: str, header: List[str], cols: Iterable[List[Any]]):
+    if not PYARROW:
+        raise SystemExit("Parquet export needs pyarrow:  pip install pyarrow")
+    arrays = []
+    for col in cols:
+        try:
+            arrays.append(pa.array(col))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Mixed value types in one column (e.g. '12' and 12.0) → text
+            arrays.append(pa.array([None if v is None else str(v) for v in col], pa.string()))
+    _ensure_dir(os.path.dirname(os.path.abspath(out_parquet)))
+    pq.write_table(pa.Table.from_arrays(arrays, names=header), out_parquet, compression="zstd")
+
+
 # -------- CLI --------
 def main():
     ap = argparse.ArgumentParser(
@@ -229,14 +726,29 @@ def main():
         default="PredefinedType,Tag",
         help="Comma-separated top-level attributes to try to read (in addition to Psets), e.g. Name,Tag,PredefinedType"
     )
+    ap.add_argument("--xlsx", default="", help="Also write an Excel workbook to this path (needs pandas + openpyxl)")
+    ap.add_argument("--parquet", default="", help="Also write a Parquet file to this path (needs pyarrow)")
+    ap.add_argument(
+        "--psets",
+        default="all",
+        help="Psets/Qto to export: all, none, or comma-separated names, e.g. Pset_WallCommon,Qto_WallBaseQuantities"
+    )
     ap.add_argument("--limit", type=int, default=0, help="Limit number of elements (debug)")
+    ap.add_argument("-j", "--workers", type=int, default=1,
+                    help="Worker processes for the ifcopenshell path (default: 1, no pool)")
 
     args = ap.parse_args()
 
     classes = [c.strip() for c in args.classes.split(",")] if args.classes else []
     props = [p.strip() for p in args.props.split(",")] if args.props else []
-
-    extract(args.ifc, args.out, classes, props, args.limit)
+    if args.psets.strip().lower() == "all":
+        psets = None
+    elif args.psets.strip().lower() == "none":
+        psets = set()
+    else:
+        psets = {s.strip() for s in args.psets.split(",") if s.strip()}
+
+    extract(args.ifc, args.out, classes, props, args.limit, args.xlsx, args.workers, args.parquet, psets)
 
 
 if __name__ == "__main__":